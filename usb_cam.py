@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 """
-usb_cam_demo_single.py
+usb_cam.py
 
-Single USB camera DeepStream demo with Smart Recording.
+USB camera DeepStream demo with Smart Recording (one or more cameras, batched).
 
 What this example shows:
 - USB Smart Record using **manual NvDsSR** (because USB/v4l2 sources do not support nvurisrcbin Smart Record):
-    * Auto-trigger when a **person** is detected (with confidence >= MIN_PERSON_CONF)
-    * Manual trigger by pressing **R**
+    * Auto-trigger when a **person** is detected (with confidence >= MIN_PERSON_CONF), per camera
+    * Manual trigger by pressing **R** (all cameras)
 
 Overlay behavior:
 - Only the person bounding box is shown.
@@ -16,39 +16,43 @@ Overlay behavior:
 
 Requirements:
 - NVIDIA Jetson / DeepStream Python environment (gi + pyds)
-- smartrec_clean.py in the same folder (or in PYTHONPATH)
+- usb_smartrec.py and usb_probe.py in the same folder (or in PYTHONPATH)
 """
 
 from __future__ import annotations
 
+import configparser
+import logging
+import math
 import os
 import sys
-import time
 from dataclasses import dataclass
+from typing import List, Optional, Tuple
 
 import gi
 
 gi.require_version("Gst", "1.0")
 gi.require_version("GstVideo", "1.0")
-gi.require_version("Gtk", "3.0")
 
-from gi.repository import Gst, GstVideo, Gtk, Gdk  # noqa: E402
+from gi.repository import GLib, Gst, GstVideo  # noqa: E402
 
-import pyds  # noqa: E402
-
-# IMPORTANT: include smartrec_clean.py in your repo next to this file
-from usb_smartrec import SmartRecManager  # noqa: E402
+# IMPORTANT: include usb_smartrec.py and usb_probe.py in your repo next to this file
+from usb_probe import OsdProbe  # noqa: E402
+from usb_smartrec import SmartRecManager, init_logging as init_smartrec_logging  # noqa: E402
 
 
 # -----------------------------------------------------------------------------
 # CONFIG (edit these for your machine)
 # -----------------------------------------------------------------------------
 
-USB_DEVICE = "/dev/video0"
+# One or more USB cameras; all are batched through a single nvstreammux/nvinfer.
+# Source i records with Smart Record sid=i.
+USB_DEVICES = ["/dev/video0"]
 
 # Request MJPEG from the camera (common for USB cameras on Jetson). Adjust if needed.
 CAM_W, CAM_H, CAM_FPS = 1280, 720, 30
 USB_CAPS = f"image/jpeg,width={CAM_W},height={CAM_H},framerate={CAM_FPS}/1"
+V4L2_IO_MODE = 4           # 4 = dmabuf (zero-copy into nvv4l2decoder); 2 = mmap if your driver complains
 
 # DeepStream primary detector config (must exist)
 PGIE_CONFIG = "dstest1_pgie_config.txt"
@@ -56,17 +60,38 @@ PGIE_CONFIG = "dstest1_pgie_config.txt"
 # Keep mux resolution the same as camera for a simple demo.
 MUX_W, MUX_H = CAM_W, CAM_H
 
+# DeepStream >= 6.2: nvdsosd draws on NV12 in GPU mode. Set False on older releases (adds RGBA conversion).
+OSD_NV12 = True
+
+# Fullscreen display. False = headless (fakesink): inference + Smart Record only.
+DISPLAY = True
+
 # Smart Record output
 SMARTREC_DIR = "SmartRecDir"
 SR_CACHE_SEC = 60          # circular cache size (seconds)
 SR_BACK_SEC = 10           # seconds before trigger
 SR_FRONT_SEC = 10          # seconds after trigger
 SR_COOLDOWN_SEC = 60.0     # seconds between auto triggers
+SR_IFRAME_INTERVAL = max(1, CAM_FPS // 2)   # 0.5 s GOP: clip start lands within half a second
 
 # Person identification
 PERSON_CLASS_IDS = {0}     # often 0; update if your model differs
 MIN_PERSON_CONF = 0.35     # show/trigger only if confidence >= this
 
+# Streaming-thread scheduling (Linux). Pins the capture/decode/mux/infer threads to
+# STREAM_CPUS with SCHED_RR so the desktop can't preempt them. Needs CAP_SYS_NICE
+# (see README); without it the demo just prints a warning and keeps default scheduling.
+TUNE_STREAM_THREADS = True
+STREAM_CPUS = {2, 3}
+STREAM_RR_PRIORITY = 40
+# GStreamer names each streaming thread "<element>:<pad>" (truncated to 15 chars)
+STREAM_THREAD_PREFIXES = ("v4l2src_", "mjpeg_dec_", "q_main_", "mux:", "pgie:")
+
+# GTK is only needed for the fullscreen window; headless mode runs a plain GLib main loop.
+if DISPLAY:
+    gi.require_version("Gtk", "3.0")
+    from gi.repository import Gdk, Gtk  # noqa: E402
+
 # DeepStream env tweak (safe)
 os.environ["NVSTREAMMUX_ADAPTIVE_BATCHING"] = "yes"
 
@@ -77,7 +102,18 @@ os.environ["NVSTREAMMUX_ADAPTIVE_BATCHING"] = "yes"
 
 SRM = SmartRecManager(SMARTREC_DIR, cache_sec=SR_CACHE_SEC, file_prefix="cam")
 SRM.set_cooldown(SR_COOLDOWN_SEC)
-_last_auto_trigger = 0.0
+
+# OSD probe (see usb_probe.py). It only flags pending auto-triggers; the main loop
+# calls SRM.start(), which takes GObject locks and must not run on the streaming thread.
+# Its person ids are extended at startup with the "person" index from the labels file,
+# and build_usb_pipeline() resizes it to the number of devices actually used.
+PROBE = OsdProbe(
+    PERSON_CLASS_IDS,
+    min_conf=MIN_PERSON_CONF,
+    cooldown_ns=int(SR_COOLDOWN_SEC * Gst.SECOND),
+    num_sources=len(USB_DEVICES),
+)
+SR_POLL_MS = 50
 
 
 # -----------------------------------------------------------------------------
@@ -109,100 +145,124 @@ def _make_queue(name: str, leaky: bool, max_buf: int) -> Gst.Element:
     return q
 
 
+def _nvmm_caps(fmt: Optional[str] = None, width: int = 0, height: int = 0, fps: int = 0) -> Gst.Caps:
+    """
+    video/x-raw(memory:NVMM) caps built field by field (no caps-string parsing).
+    Fields left at None/0 are not constrained.
+    """
+    st = Gst.Structure.new_empty("video/x-raw")
+    if fmt:
+        st.set_value("format", fmt)
+    if width:
+        st.set_value("width", int(width))
+    if height:
+        st.set_value("height", int(height))
+    if fps:
+        st.set_value("framerate", Gst.Fraction(int(fps), 1))
+
+    caps = Gst.Caps.new_empty()
+    caps.append_structure(st)
+    caps.set_features(0, Gst.CapsFeatures.from_string("memory:NVMM"))
+    return caps
+
+
+def _link_chain(elements: List[Gst.Element]) -> None:
+    """Link elements in order (a -> b -> c ...), raising on the first failure."""
+    for a, b in zip(elements, elements[1:]):
+        if not a.link(b):
+            raise RuntimeError(f"Link failed: {a.get_name()} -> {b.get_name()}")
+
+
 # -----------------------------------------------------------------------------
-# OSD probe: hide non-person classes + show person confidence + SR auto trigger
+# nvinfer config helpers
 # -----------------------------------------------------------------------------
 
-def _get_obj_label(obj: pyds.NvDsObjectMeta) -> str:
-    """Best-effort label (some models set obj_label; others rely on class_id)."""
-    try:
-        return pyds.get_string(obj.obj_label).strip().lower()
-    except Exception:
-        return ""
+# nvinfer network-mode values
+_NETWORK_MODES = {0: "FP32", 1: "INT8", 2: "FP16"}
 
 
-def _get_obj_conf(obj: pyds.NvDsObjectMeta) -> float:
-    """Best-effort confidence."""
+def _read_pgie_config(path: str) -> configparser.ConfigParser:
+    """Parse the nvinfer config file (INI-style). Missing/unreadable file -> empty parser."""
+    cfg = configparser.ConfigParser(interpolation=None, strict=False)
     try:
-        return float(getattr(obj, "confidence", -1.0))
-    except Exception:
-        return -1.0
+        cfg.read(path, encoding="utf-8")
+    except configparser.Error as e:
+        print(f"[PGIE] WARNING: could not parse {path}: {e}")
+    return cfg
 
 
-def osd_sink_probe(_pad: Gst.Pad, info: Gst.PadProbeInfo, _u_data) -> Gst.PadProbeReturn:
-    """
-    Runs on each frame at nvdsosd sink:
-    - Keep only person boxes visible
-    - Set label text to: "person XX.X%"
-    - Auto-trigger Smart Record when a person is present (with cooldown)
+def _check_pgie_precision(cfg: configparser.ConfigParser, config_path: str) -> None:
     """
-    global _last_auto_trigger
+    Report the engine precision selected by the config.
 
-    buf = info.get_buffer()
-    if not buf:
-        return Gst.PadProbeReturn.OK
+    network-mode is only read from the config file (nvinfer has no GObject property for it),
+    so we can't force INT8 from here; we point out when it is available but unused.
+    """
+    try:
+        mode = cfg.getint("property", "network-mode", fallback=0)
+    except ValueError:
+        raw = cfg.get("property", "network-mode", fallback="")
+        print(f"[PGIE] WARNING: network-mode={raw!r} in {config_path} is not an integer; engine precision unknown.")
+        return
+    calib = cfg.get("property", "int8-calib-file", fallback="").strip()
+    if calib and not os.path.isabs(calib):
+        calib = os.path.join(os.path.dirname(os.path.abspath(config_path)), calib)
+    has_calib = bool(calib) and os.path.isfile(calib)
+
+    name = _NETWORK_MODES.get(mode, str(mode))
+    if mode == 1 and not has_calib:
+        print("[PGIE] WARNING: network-mode=1 (INT8) but int8-calib-file is missing; engine build will fail.")
+    elif mode != 1 and has_calib:
+        print(
+            f"[PGIE] WARNING: running {name} although an INT8 calibration table exists ({calib}). "
+            "Set network-mode=1 and rebuild the engine for ~1.4-2x PGIE throughput."
+        )
+    else:
+        print(f"[PGIE] Engine precision: {name}")
 
-    batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(buf))
-    if not batch_meta:
-        return Gst.PadProbeReturn.OK
 
-    saw_person = False
+def _person_ids_from_labels(cfg: configparser.ConfigParser, config_path: str) -> Optional[frozenset]:
+    """
+    Class ids labelled "person" in the config's labelfile-path (one label per line, line index = class id).
+    Returns None if the labels file is missing or unreadable.
+    """
+    path = cfg.get("property", "labelfile-path", fallback="").strip()
+    if not path:
+        return None
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(config_path)), path)
+    try:
+        with open(path, encoding="utf-8") as f:
+            labels = [line.strip().lower() for line in f]
+    except OSError as e:
+        print(f"[PGIE] WARNING: could not read labels file {path}: {e}")
+        return None
+    return frozenset(i for i, name in enumerate(labels) if name == "person")
 
-    l_frame = batch_meta.frame_meta_list
-    while l_frame is not None:
-        try:
-            frame_meta = pyds.NvDsFrameMeta.cast(l_frame.data)
-        except StopIteration:
-            break
 
-        l_obj = frame_meta.obj_meta_list
-        while l_obj is not None:
-            try:
-                obj = pyds.NvDsObjectMeta.cast(l_obj.data)
-            except StopIteration:
-                break
+def _resolve_person_ids(cfg: configparser.ConfigParser, config_path: str) -> None:
+    """Merge the labels-file "person" ids into the OSD probe (done once at startup)."""
+    ids = _person_ids_from_labels(cfg, config_path)
+    if ids is None:
+        print("[PGIE] Person class id will be learned from object labels at runtime.")
+        return
+    PROBE.add_person_ids(ids)
+    print(f"[PGIE] Person class ids: {sorted(PROBE.person_ids)}")
 
-            try:
-                class_id = int(getattr(obj, "class_id", -1))
-                label = _get_obj_label(obj)
-                conf = _get_obj_conf(obj)
-
-                is_person = (class_id in PERSON_CLASS_IDS) or (label == "person")
-                show = bool(is_person and conf >= MIN_PERSON_CONF)
-
-                # Hide everything by default
-                if not show:
-                    obj.rect_params.border_width = 0
-                    obj.text_params.display_text = ""
-                else:
-                    saw_person = True
-                    obj.rect_params.border_width = 3
-                    # Keep default OSD border color; you can set it if you want.
-                    obj.text_params.display_text = f"person {conf * 100.0:.1f}%"
-            except Exception:
-                # Never crash the pipeline on overlay issues
-                pass
 
-            try:
-                l_obj = l_obj.next
-            except StopIteration:
-                break
+# -----------------------------------------------------------------------------
+# Smart Record auto trigger (main loop side of the OSD probe)
+# -----------------------------------------------------------------------------
 
-        try:
-            l_frame = l_frame.next
-        except StopIteration:
-            break
-
-    # Auto-trigger Smart Record when a person is visible
-    if saw_person:
-        now = time.monotonic()
-        if (now - _last_auto_trigger) >= SR_COOLDOWN_SEC:
-            ok = SRM.start(sid=0, back_sec=SR_BACK_SEC, front_sec=SR_FRONT_SEC, label="person")
+def _poll_sr_pending() -> bool:
+    """Main-loop timer: start Smart Record requested by the OSD probe."""
+    for sid, pending in enumerate(PROBE.pending):
+        if pending.is_set():
+            pending.clear()
+            ok = SRM.start(sid=sid, back_sec=SR_BACK_SEC, front_sec=SR_FRONT_SEC, label="person")
             if ok:
-                print("[SR] Auto-trigger started (person)")
-            _last_auto_trigger = now
-
-    return Gst.PadProbeReturn.OK
+                print(f"[SR] Auto-trigger started (person, sid={sid})")
+    return True  # keep the timer alive
 
 
 # -----------------------------------------------------------------------------
@@ -210,10 +270,11 @@ def osd_sink_probe(_pad: Gst.Pad, info: Gst.PadProbeInfo, _u_data) -> Gst.PadPro
 # -----------------------------------------------------------------------------
 
 class FullscreenWindow:
-    """Minimal fullscreen GTK window for nveglglessink via GstVideoOverlay."""
+    """Minimal fullscreen GTK window for nv3dsink / nveglglessink via GstVideoOverlay."""
 
-    def __init__(self, sink: Gst.Element):
+    def __init__(self, sink: Gst.Element, num_sources: int):
         self.sink = sink
+        self.num_sources = num_sources
 
         self.win = Gtk.Window()
         self.win.set_title("USB Camera Demo (DeepStream)")
@@ -250,9 +311,10 @@ class FullscreenWindow:
             return True
 
         if event.keyval in (Gdk.KEY_r, Gdk.KEY_R):
-            ok = SRM.start(sid=0, back_sec=SR_BACK_SEC, front_sec=SR_FRONT_SEC, label="key_R")
-            if ok:
-                print("[SR] Manual trigger started (key_R)")
+            for sid in range(self.num_sources):
+                ok = SRM.start(sid=sid, back_sec=SR_BACK_SEC, front_sec=SR_FRONT_SEC, label="key_R")
+                if ok:
+                    print(f"[SR] Manual trigger started (key_R, sid={sid})")
             return True
 
         return False
@@ -265,226 +327,421 @@ class FullscreenWindow:
 # Pipeline construction (USB only)
 # -----------------------------------------------------------------------------
 
+def _make_display_tail() -> List[Gst.Element]:
+    """
+    Elements after nvdsosd, in link order (last one is the sink):
+    - DISPLAY=False: fakesink (headless, no render copy at all)
+    - DISPLAY=True:  nv3dsink (renders NVMM directly), or nvegltransform -> nveglglessink if unavailable
+    """
+    if not DISPLAY:
+        sink = Gst.ElementFactory.make("fakesink", "sink")
+        if not sink:
+            raise RuntimeError("Failed to create fakesink")
+        for prop, val in (("sync", False), ("async", False), ("qos", False)):
+            sink.set_property(prop, val)
+        return [sink]
+
+    tail = []
+    sink = Gst.ElementFactory.make("nv3dsink", "sink")
+    if not sink:
+        egltrans = Gst.ElementFactory.make("nvegltransform", "egltrans")
+        sink = Gst.ElementFactory.make("nveglglessink", "sink")
+        if not (egltrans and sink):
+            raise RuntimeError("Failed to create display sink (nv3dsink / nveglglessink)")
+        tail.append(egltrans)
+    tail.append(sink)
+
+    sink.set_property("sync", 0)
+    sink.set_property("qos", 1)
+    try:
+        sink.set_property("force-aspect-ratio", True)
+    except Exception:
+        pass
+    return tail
+
+
 @dataclass
 class PipelineParts:
     pipeline: Gst.Pipeline
     sink: Gst.Element
+    sources: List[Gst.Element]  # v4l2src per sid
+    num_sources: int
 
 
-def build_usb_pipeline() -> PipelineParts:
+def _build_usb_source(pipe: Gst.Pipeline, i: int, device: str) -> Tuple[Gst.Element, Gst.Element]:
     """
-    Build a USB-only pipeline with a tee:
-    - Branch A: inference + display
-    - Branch B: encode + manual Smart Record recordbin
+    USB source i -> MJPEG -> NVMM (NV12).
+    Returns (v4l2src, last element); the caller links the last element to nvstreammux.
     """
-    pipe = Gst.Pipeline.new("usb_singlecam_demo")
-    if not pipe:
-        raise RuntimeError("Failed to create pipeline")
+    v4l2 = Gst.ElementFactory.make("v4l2src", f"v4l2src_{i}")
+    caps_mjpg = Gst.ElementFactory.make("capsfilter", f"caps_mjpg_{i}")
+    dec = Gst.ElementFactory.make("nvv4l2decoder", f"mjpeg_dec_{i}")
+    nvvidconv = Gst.ElementFactory.make("nvvidconv", f"nvvidconv_{i}")
+    caps_nvmm = Gst.ElementFactory.make("capsfilter", f"caps_nvmm_{i}")
+
+    if not all([v4l2, caps_mjpg, dec, nvvidconv, caps_nvmm]):
+        raise RuntimeError(f"Failed to create USB decode elements ({device})")
+
+    v4l2.set_property("device", device)
+    v4l2.set_property("do-timestamp", True)
+    # dmabuf: hand the V4L2 buffers to the decoder without a userspace memcpy
+    try:
+        v4l2.set_property("io-mode", V4L2_IO_MODE)
+    except Exception:
+        pass
+    # USB_CAPS pins width/height/framerate so the driver picks a low-latency mode
+    caps_mjpg.set_property("caps", Gst.Caps.from_string(USB_CAPS))
 
-    # USB source -> MJPEG -> NVMM (NV12)
-    v4l2 = Gst.ElementFactory.make("v4l2src", "v4l2src")
-    caps_mjpg = Gst.ElementFactory.make("capsfilter", "caps_mjpg")
-    dec = Gst.ElementFactory.make("nvv4l2decoder", "mjpeg_dec")
-    nvvidconv = Gst.ElementFactory.make("nvvidconv", "nvvidconv")
-    caps_nvmm = Gst.ElementFactory.make("capsfilter", "caps_nvmm")
-    tee = Gst.ElementFactory.make("tee", "tee")
+    # Many MJPEG USB cams require this on Jetson; the rest keeps the decoder pool minimal
+    for prop, val in (("mjpeg", 1), ("disable-dpb", True), ("num-extra-surfaces", 0)):
+        try:
+            dec.set_property(prop, val)
+        except Exception:
+            pass
 
-    if not all([v4l2, caps_mjpg, dec, nvvidconv, caps_nvmm, tee]):
-        raise RuntimeError("Failed to create USB decode elements")
+    caps_nvmm.set_property("caps", _nvmm_caps("NV12"))
 
-    v4l2.set_property("device", USB_DEVICE)
-    caps_mjpg.set_property("caps", Gst.Caps.from_string(USB_CAPS))
+    for e in (v4l2, caps_mjpg, dec, nvvidconv, caps_nvmm):
+        pipe.add(e)
 
-    # Many MJPEG USB cams require this on Jetson
+    if not v4l2.link(caps_mjpg):
+        raise RuntimeError(f"Link failed: v4l2src_{i} -> caps_mjpg_{i}")
+    if not caps_mjpg.link(dec):
+        raise RuntimeError(f"Link failed: caps_mjpg_{i} -> decoder_{i}")
+    if not dec.link(nvvidconv):
+        raise RuntimeError(f"Link failed: decoder_{i} -> nvvidconv_{i}")
+    if not nvvidconv.link(caps_nvmm):
+        raise RuntimeError(f"Link failed: nvvidconv_{i} -> caps_nvmm_{i}")
+
+    return v4l2, caps_nvmm
+
+
+def _build_sr_branch(pipe: Gst.Pipeline, i: int, demux: Gst.Element) -> None:
+    """
+    Branch B for source i: demux.src_i -> sr_conv -> [caps_sr] -> q_sr -> sr_enc -> q_sr_enc -> sr_parse -> recordbin.
+    Attaches manual Smart Record with sid=i.
+    """
+    # The pre-event circular cache lives inside the NvDsSR recordbin (SR_CACHE_SEC),
+    # not in these queues. They only absorb jitter, and stay leaky/small so a slow
+    # encoder can never backpressure the tee (and stall the display branch).
+    q_sr = _make_queue(f"q_sr_{i}", leaky=True, max_buf=4)
+    q_sr.set_property("max-size-time", SR_BACK_SEC * Gst.SECOND)
+    q_sr.set_property("max-size-bytes", 64 << 20)
+
+    # sr_conv copies each frame out of the nvstreammux pool right at the demux, so q_sr and
+    # the encoder only ever hold sr_conv's own buffers and can't starve the mux.
+    sr_conv = Gst.ElementFactory.make("nvvideoconvert", f"sr_conv_{i}")
+    if not sr_conv:
+        raise RuntimeError("Failed to create SR converter")
     try:
-        dec.set_property("mjpeg", 1)
+        sr_conv.set_property("disable-passthrough", True)
     except Exception:
         pass
 
-    caps_nvmm.set_property("caps", Gst.Caps.from_string("video/x-raw(memory:NVMM),format=NV12"))
-    tee.set_property("allow-not-linked", True)
+    # Prefer hardware encoder on Jetson (NV12 NVMM copy); fallback to software encoder
+    # (sr_conv then negotiates system memory for it).
+    caps_sr = None
+    sr_enc = Gst.ElementFactory.make("nvv4l2h264enc", f"sr_enc_{i}")
+    if sr_enc:
+        caps_sr = Gst.ElementFactory.make("capsfilter", f"caps_sr_{i}")
+        if not caps_sr:
+            raise RuntimeError("Failed to create SR caps filter")
+        caps_sr.set_property("caps", _nvmm_caps("NV12"))
+    else:
+        sr_enc = Gst.ElementFactory.make("openh264enc", f"sr_enc_sw_{i}")
+    q_sr_enc = _make_queue(f"q_sr_enc_{i}", leaky=False, max_buf=2)
+    sr_parse = Gst.ElementFactory.make("h264parse", f"sr_parse_{i}")
 
-    # ---------------- Branch A: inference + display ----------------
-    q_main = _make_queue("q_main", leaky=True, max_buf=1)
+    if not all([q_sr, sr_enc, q_sr_enc, sr_parse]):
+        raise RuntimeError("Failed to create SR encode elements")
+
+    # Encoder tuning (best-effort). Smart Record cuts clips on I-frames, so a short GOP
+    # keeps clip boundaries tight; VBR + UltraFast keeps NVENC load low.
+    for prop, val in (
+        ("bitrate", 8_000_000),
+        ("control-rate", 0),                       # 0 = VBR, 1 = CBR
+        ("iframeinterval", SR_IFRAME_INTERVAL),
+        ("insert-sps-pps", 1),
+        ("insert-vui", 1),                         # carry SAR so players don't rescale
+        ("profile", 2),                            # Main
+        ("preset-level", 1),                       # UltraFast
+    ):
+        try:
+            sr_enc.set_property(prop, val)
+        except Exception:
+            pass
 
+    chain = [sr_conv] + ([caps_sr] if caps_sr else []) + [q_sr, sr_enc, q_sr_enc, sr_parse]
+    for e in chain:
+        pipe.add(e)
+
+    demux_src = demux.request_pad_simple(f"src_{i}")
+    if not demux_src:
+        raise RuntimeError(f"Could not request demux.src_{i}")
+    if demux_src.link(sr_conv.get_static_pad("sink")) != Gst.PadLinkReturn.OK:
+        raise RuntimeError(f"Link failed: demux.src_{i} -> sr_conv_{i}")
+    _link_chain(chain)
+
+    # Attach manual Smart Record to this source (sid=i)
+    recordbin_ptr = SRM.attach_source(i, demux, friendly_name=f"cam{i}", is_manual=True)
+    if recordbin_ptr:
+        ok = SRM.link_recordbin(pipe, recordbin_ptr, sr_parse)
+        if ok:
+            print(f"[SR] Manual NvDsSR recordbin linked (USB, sid={i}).")
+        else:
+            print(f"[SR] WARNING: Failed to link recordbin (sid={i}, recording disabled).")
+    else:
+        print(f"[SR] WARNING: Manual SR not available (sid={i}, library missing or attach failed).")
+
+
+def build_usb_pipeline(devices: List[str]) -> PipelineParts:
+    """
+    Build a USB-only pipeline: all sources batched through nvstreammux -> nvinfer -> tee:
+    - Branch A: (tiler) -> OSD -> display
+    - Branch B: nvstreamdemux -> per-source encode + manual Smart Record recordbin (sid = device index)
+
+    The tee sits after nvinfer and before the OSD, so inference runs once per frame and the
+    frames stay NV12 NVMM in GPU memory. nvdsosd draws in place, so the display branch
+    always draws on its own copy (tiler, RGBA conversion, or osd_copy for one camera with
+    OSD_NV12), and each SR branch starts with an nvvideoconvert copy (sr_conv) so a slow
+    encoder never holds nvstreammux pool buffers. Clips therefore carry no overlay.
+
+    Trade-off: recordings only contain frames that reached nvstreammux; frames the leaky
+    q_main_i drops while inference falls behind are missing from the clips too.
+    """
+    if not devices:
+        raise ValueError("build_usb_pipeline needs at least one USB device")
+    n = len(devices)
+    PROBE.set_num_sources(n)
+
+    pipe = Gst.Pipeline.new("usb_cam_demo")
+    if not pipe:
+        raise RuntimeError("Failed to create pipeline")
+
+    # ---------------- Branch A: inference + display ----------------
     mux = Gst.ElementFactory.make("nvstreammux", "mux")
     caps_post_mux = Gst.ElementFactory.make("capsfilter", "caps_post_mux")
     pgie = Gst.ElementFactory.make("nvinfer", "pgie")
-    conv_rgba = Gst.ElementFactory.make("nvvideoconvert", "conv_rgba")
-    caps_rgba = Gst.ElementFactory.make("capsfilter", "caps_rgba")
+    tee = Gst.ElementFactory.make("tee", "tee")
+    q_disp = _make_queue("q_disp", leaky=True, max_buf=1)
     osd = Gst.ElementFactory.make("nvdsosd", "osd")
-    egltrans = Gst.ElementFactory.make("nvegltransform", "egltrans")
-    sink = Gst.ElementFactory.make("nveglglessink", "sink")
 
-    if not all([mux, caps_post_mux, pgie, conv_rgba, caps_rgba, osd, egltrans, sink]):
+    q_demux = _make_queue("q_demux", leaky=False, max_buf=2)
+    demux = Gst.ElementFactory.make("nvstreamdemux", "demux")
+
+    if not all([mux, caps_post_mux, pgie, tee, osd, demux]):
         raise RuntimeError("Failed to create display/infer elements")
 
-    mux.set_property("batch-size", 1)
+    tee.set_property("allow-not-linked", True)
+
+    # DS >= 6.2: nvdsosd in GPU mode draws directly on NV12, no RGBA conversion pass.
+    # Older releases need nvvideoconvert -> RGBA in front of the OSD.
+    osd_in = []
+    if OSD_NV12:
+        osd.set_property("process-mode", 1)
+        if n == 1:
+            # No tiler to produce a new frame: nvdsosd would draw on the very NvBufSurface
+            # the SR branch encodes, so give the display branch its own NV12 copy.
+            osd_copy = Gst.ElementFactory.make("nvvideoconvert", "osd_copy")
+            if not osd_copy:
+                raise RuntimeError("Failed to create nvvideoconvert (osd_copy)")
+            try:
+                osd_copy.set_property("disable-passthrough", True)
+            except Exception:
+                pass
+            osd_in = [osd_copy]
+    else:
+        conv_rgba = Gst.ElementFactory.make("nvvideoconvert", "conv_rgba")
+        caps_rgba = Gst.ElementFactory.make("capsfilter", "caps_rgba")
+        if not (conv_rgba and caps_rgba):
+            raise RuntimeError("Failed to create RGBA conversion elements")
+        caps_rgba.set_property("caps", _nvmm_caps("RGBA", MUX_W, MUX_H, CAM_FPS))
+        osd_in = [conv_rgba, caps_rgba]
+
+    display_tail = _make_display_tail()
+    sink = display_tail[-1]
+
+    # Several cameras: composite the batch into one frame for the single sink
+    tiler = None
+    if n > 1:
+        tiler = Gst.ElementFactory.make("nvmultistreamtiler", "tiler")
+        if not tiler:
+            raise RuntimeError("Failed to create nvmultistreamtiler")
+        cols = math.ceil(math.sqrt(n))
+        tiler.set_property("rows", math.ceil(n / cols))
+        tiler.set_property("columns", cols)
+        tiler.set_property("width", int(MUX_W))
+        tiler.set_property("height", int(MUX_H))
+
+    mux.set_property("batch-size", n)
     mux.set_property("live-source", 1)
     mux.set_property("width", int(MUX_W))
     mux.set_property("height", int(MUX_H))
-    mux.set_property("batched-push-timeout", int(1_000_000 / max(1, CAM_FPS)))
+    # Single live camera: push each frame immediately. Several cameras: wait at most
+    # half a frame interval for the rest of the batch.
+    mux.set_property("batched-push-timeout", 0 if n == 1 else 1_000_000 // (2 * max(1, CAM_FPS)))
     try:
         mux.set_property("sync-inputs", 0)
     except Exception:
         pass
 
-    caps_post_mux.set_property(
-        "caps",
-        Gst.Caps.from_string(f"video/x-raw(memory:NVMM),width={MUX_W},height={MUX_H},framerate={CAM_FPS}/1"),
-    )
+    caps_post_mux.set_property("caps", _nvmm_caps(None, MUX_W, MUX_H, CAM_FPS))
 
     # nvinfer: unique-id MUST be set (fixes 'Unique ID not set')
+    # batch-size must match the TensorRT engine (rebuild it with batch=N for N cameras).
     pgie.set_property("config-file-path", PGIE_CONFIG)
     pgie.set_property("unique-id", 1)
-    try:
-        pgie.set_property("batch-size", 1)
-    except Exception:
-        pass
+    pgie_cfg = _read_pgie_config(PGIE_CONFIG)
+    _check_pgie_precision(pgie_cfg, PGIE_CONFIG)
+    _resolve_person_ids(pgie_cfg, PGIE_CONFIG)
+    # gpu-id pinned; output-tensor-meta off (we only need object meta, skip the tensor copy)
+    for prop, val in (("batch-size", n), ("gpu-id", 0), ("output-tensor-meta", False)):
+        try:
+            pgie.set_property(prop, val)
+        except Exception:
+            pass
 
-    caps_rgba.set_property(
-        "caps",
-        Gst.Caps.from_string(f"video/x-raw(memory:NVMM),format=RGBA,width={MUX_W},height={MUX_H},framerate={CAM_FPS}/1"),
-    )
+    # Inference: mux -> caps_post_mux -> pgie -> tee
+    # Branch A:  tee -> q_disp -> [tiler] -> [osd_copy | conv_rgba -> caps_rgba] -> osd -> [egltrans] -> sink
+    # Branch B:  tee -> q_demux -> demux -> (per source, see _build_sr_branch)
+    infer = [mux, caps_post_mux, pgie, tee]
+    branch_a = [q_disp] + ([tiler] if tiler else []) + osd_in + [osd] + display_tail
+    for e in infer + branch_a + [q_demux, demux]:
+        pipe.add(e)
 
-    sink.set_property("sync", 0)
-    sink.set_property("qos", 1)
-    try:
-        sink.set_property("force-aspect-ratio", True)
-    except Exception:
-        pass
+    # Sources: v4l2 chain_i -> q_main_i -> mux.sink_i
+    sources = []
+    for i, device in enumerate(devices):
+        v4l2, src_out = _build_usb_source(pipe, i, device)
+        sources.append(v4l2)
 
-    # ---------------- Branch B: encode + Smart Record ----------------
-    q_sr = _make_queue("q_sr", leaky=False, max_buf=30)
-    sr_conv = Gst.ElementFactory.make("nvvideoconvert", "sr_conv")
+        q_main = _make_queue(f"q_main_{i}", leaky=True, max_buf=1)
+        pipe.add(q_main)
+        if not src_out.link(q_main):
+            raise RuntimeError(f"Link failed: {src_out.get_name()} -> q_main_{i}")
 
-    # Prefer hardware encoder on Jetson; fallback to software encoder.
-    sr_enc = Gst.ElementFactory.make("nvv4l2h264enc", "sr_enc") or Gst.ElementFactory.make("openh264enc", "sr_enc_sw")
-    sr_parse = Gst.ElementFactory.make("h264parse", "sr_parse")
+        mux_sink = mux.request_pad_simple(f"sink_{i}")
+        if not mux_sink:
+            raise RuntimeError(f"Could not request mux.sink_{i}")
+        if q_main.get_static_pad("src").link(mux_sink) != Gst.PadLinkReturn.OK:
+            raise RuntimeError(f"Link failed: q_main_{i}.src -> mux.sink_{i}")
 
-    if not all([q_sr, sr_conv, sr_enc, sr_parse]):
-        raise RuntimeError("Failed to create SR encode elements")
+    _link_chain(infer)
 
-    # Encoder tuning (best-effort)
-    for prop, val in (("bitrate", 8_000_000), ("insert-sps-pps", 1), ("iframeinterval", 30)):
-        try:
-            sr_enc.set_property(prop, val)
-        except Exception:
-            pass
+    tee_src_disp = _request_tee_src_pad(tee)
+    if tee_src_disp.link(q_disp.get_static_pad("sink")) != Gst.PadLinkReturn.OK:
+        raise RuntimeError("Link failed: tee -> q_disp")
+    _link_chain(branch_a)
 
-    # Add all elements
-    for e in (
-        v4l2, caps_mjpg, dec, nvvidconv, caps_nvmm, tee,
-        q_main, mux, caps_post_mux, pgie, conv_rgba, caps_rgba, osd, egltrans, sink,
-        q_sr, sr_conv, sr_enc, sr_parse,
-    ):
-        pipe.add(e)
+    tee_src_sr = _request_tee_src_pad(tee)
+    if tee_src_sr.link(q_demux.get_static_pad("sink")) != Gst.PadLinkReturn.OK:
+        raise RuntimeError("Link failed: tee -> q_demux")
+    _link_chain([q_demux, demux])
+    for i in range(n):
+        _build_sr_branch(pipe, i, demux)
 
-    # Link decode -> tee
-    if not v4l2.link(caps_mjpg):
-        raise RuntimeError("Link failed: v4l2src -> caps_mjpg")
-    if not caps_mjpg.link(dec):
-        raise RuntimeError("Link failed: caps_mjpg -> decoder")
-    if not dec.link(nvvidconv):
-        raise RuntimeError("Link failed: decoder -> nvvidconv")
-    if not nvvidconv.link(caps_nvmm):
-        raise RuntimeError("Link failed: nvvidconv -> caps_nvmm")
-    if not caps_nvmm.link(tee):
-        raise RuntimeError("Link failed: caps_nvmm -> tee")
-
-    # Branch A: tee -> q_main -> mux.sink_0 -> caps_post_mux -> pgie -> conv_rgba -> caps_rgba -> osd -> egltrans -> sink
-    tee_src_main = _request_tee_src_pad(tee)
-    if tee_src_main.link(q_main.get_static_pad("sink")) != Gst.PadLinkReturn.OK:
-        raise RuntimeError("Link failed: tee -> q_main")
-
-    mux_sink0 = mux.request_pad_simple("sink_0")
-    if not mux_sink0:
-        raise RuntimeError("Could not request mux.sink_0")
-    if q_main.get_static_pad("src").link(mux_sink0) != Gst.PadLinkReturn.OK:
-        raise RuntimeError("Link failed: q_main.src -> mux.sink_0")
-
-    if not mux.link(caps_post_mux):
-        raise RuntimeError("Link failed: mux -> caps_post_mux")
-    if not caps_post_mux.link(pgie):
-        raise RuntimeError("Link failed: caps_post_mux -> pgie")
-    if not pgie.link(conv_rgba):
-        raise RuntimeError("Link failed: pgie -> conv_rgba")
-    if not conv_rgba.link(caps_rgba):
-        raise RuntimeError("Link failed: conv_rgba -> caps_rgba")
-    if not caps_rgba.link(osd):
-        raise RuntimeError("Link failed: caps_rgba -> osd")
-    if not osd.link(egltrans):
-        raise RuntimeError("Link failed: osd -> egltrans")
-    if not egltrans.link(sink):
-        raise RuntimeError("Link failed: egltrans -> sink")
-
-    # OSD probe: hide non-person + show confidence + auto SR
+    # OSD probe: hide non-person + show confidence + auto SR (+ display-text toggle on osd)
     osd_sink_pad = osd.get_static_pad("sink")
     if not osd_sink_pad:
         raise RuntimeError("Failed to get osd sink pad")
-    osd_sink_pad.add_probe(Gst.PadProbeType.BUFFER, osd_sink_probe, None)
-
-    # Branch B: tee -> q_sr -> sr_conv -> sr_enc -> sr_parse -> recordbin
-    tee_src_sr = _request_tee_src_pad(tee)
-    if tee_src_sr.link(q_sr.get_static_pad("sink")) != Gst.PadLinkReturn.OK:
-        raise RuntimeError("Link failed: tee -> q_sr")
-    if not q_sr.link(sr_conv):
-        raise RuntimeError("Link failed: q_sr -> sr_conv")
-    if not sr_conv.link(sr_enc):
-        raise RuntimeError("Link failed: sr_conv -> sr_enc")
-    if not sr_enc.link(sr_parse):
-        raise RuntimeError("Link failed: sr_enc -> sr_parse")
-
-    # Attach manual Smart Record to this source (sid=0)
-    recordbin_ptr = SRM.attach_source(0, tee, friendly_name="cam0", is_manual=True)
-    if recordbin_ptr:
-        ok = SRM.link_recordbin(pipe, recordbin_ptr, sr_parse)
-        if ok:
-            print("[SR] Manual NvDsSR recordbin linked (USB).")
-        else:
-            print("[SR] WARNING: Failed to link recordbin (recording disabled).")
-    else:
-        print("[SR] WARNING: Manual SR not available (library missing or attach failed).")
+    osd_sink_pad.add_probe(Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST, PROBE, osd)
 
-    return PipelineParts(pipeline=pipe, sink=sink)
+    return PipelineParts(pipeline=pipe, sink=sink, sources=sources, num_sources=n)
 
 
 # -----------------------------------------------------------------------------
 # Bus handling
 # -----------------------------------------------------------------------------
 
-def on_bus_message(_bus: Gst.Bus, msg: Gst.Message, _user_data) -> None:
+def _quit_main_loop(loop: Optional[GLib.MainLoop]) -> None:
+    """Stop the GLib loop (headless) or the Gtk main loop (DISPLAY=True)."""
+    if loop is not None:
+        loop.quit()
+    else:
+        Gtk.main_quit()
+
+
+def on_bus_message(_bus: Gst.Bus, msg: Gst.Message, loop: Optional[GLib.MainLoop]) -> None:
     t = msg.type
     if t == Gst.MessageType.ERROR:
         err, dbg = msg.parse_error()
         sys.stderr.write(f"\n[GStreamer ERROR] {err}\n{dbg}\n")
-        Gtk.main_quit()
+        _quit_main_loop(loop)
     elif t == Gst.MessageType.EOS:
         print("[GStreamer] EOS")
-        Gtk.main_quit()
+        _quit_main_loop(loop)
 
 
 # -----------------------------------------------------------------------------
 # Main
 # -----------------------------------------------------------------------------
 
+def _tune_stream_threads() -> bool:
+    """
+    Give the streaming threads SCHED_RR priority and pin them to STREAM_CPUS.
+    Runs once from a main-loop timer, after PLAYING has spawned the threads.
+    """
+    cpus = set(STREAM_CPUS) & os.sched_getaffinity(0)
+    tuned = []
+    for tid in os.listdir("/proc/self/task"):
+        try:
+            with open(f"/proc/self/task/{tid}/comm", encoding="utf-8") as f:
+                comm = f.read().strip()
+        except OSError:
+            continue
+        if not comm.startswith(STREAM_THREAD_PREFIXES):
+            continue
+        try:
+            os.sched_setscheduler(int(tid), os.SCHED_RR, os.sched_param(STREAM_RR_PRIORITY))
+            if cpus:
+                os.sched_setaffinity(int(tid), cpus)
+        except PermissionError:
+            print("[SCHED] WARNING: no CAP_SYS_NICE; streaming threads keep default scheduling.")
+            return False
+        except OSError:
+            continue  # thread exited meanwhile
+        tuned.append(comm)
+    if tuned:
+        print(f"[SCHED] SCHED_RR/{STREAM_RR_PRIORITY} on CPUs {sorted(cpus)}: {', '.join(tuned)}")
+    return False  # one-shot timer
+
+
 def main() -> int:
     Gst.init(None)
 
-    parts = build_usb_pipeline()
+    # Smart Record "[SR DONE]" lines (queued, written off the streaming threads)
+    logging.getLogger("smartrec").setLevel(logging.INFO)
+    init_smartrec_logging()
+
+    parts = build_usb_pipeline(USB_DEVICES)
     pipeline = parts.pipeline
     sink = parts.sink
 
+    # Headless: no GTK at all, just a GLib main loop
+    loop = None if DISPLAY else GLib.MainLoop()
+
     bus = pipeline.get_bus()
     bus.add_signal_watch()
-    bus.connect("message", on_bus_message, None)
+    bus.connect("message", on_bus_message, loop)
 
+    GLib.timeout_add(SR_POLL_MS, _poll_sr_pending)
+
+    # nvinfer loads the TensorRT engine during the state change; keep model-engine-file in
+    # the config pointing at a prebuilt engine so startup doesn't rebuild it from the ONNX.
     pipeline.set_state(Gst.State.PLAYING)
 
-    _ui = FullscreenWindow(sink)
+    if TUNE_STREAM_THREADS and hasattr(os, "sched_setscheduler"):
+        GLib.timeout_add_seconds(1, _tune_stream_threads)
+
+    _ui = FullscreenWindow(sink, parts.num_sources) if DISPLAY else None
 
     try:
-        Gtk.main()
+        if loop is not None:
+            loop.run()
+        else:
+            Gtk.main()
+    except KeyboardInterrupt:
+        pass
     finally:
         try:
             pipeline.set_state(Gst.State.NULL)
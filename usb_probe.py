@@ -0,0 +1,194 @@
+"""
+usb_probe.py
+
+nvdsosd sink-pad probe used by usb_cam.py (the per-frame hot path):
+- hide every non-person box (no border, no text)
+- label person boxes with their confidence:  "person 87.3%"
+- request a Smart Record auto-trigger per source (with a PTS-based cooldown)
+- turn nvdsosd text rendering off while no person is on screen
+
+It is kept as plain Python on purpose: nearly all of its time goes into pyds (pybind11)
+attribute reads and writes, which Cython typing cannot turn into C accesses.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import FrozenSet, Iterable, List, Optional
+
+import gi
+
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst  # noqa: E402
+
+import pyds  # noqa: E402
+
+
+# Preformatted overlay labels for 0.0% .. 100.0% in 0.1% steps (index = round(conf * 1000)).
+# pyds copies display_text on assignment, so these strings are never mutated.
+_CONF_LABELS = tuple(f"person {i / 10:.1f}%" for i in range(1001))
+
+
+def _get_batch_meta_from_hash(buf: Gst.Buffer):
+    """Older pyds: batch meta lookup takes the GstBuffer address (hash(buf))."""
+    return pyds.gst_buffer_get_nvds_batch_meta(hash(buf))
+
+
+# Prefer the direct GstBuffer overload when this pyds build has it
+_get_batch_meta = getattr(pyds, "gst_buffer_get_nvds_batch_meta_from_gst_buffer", None) or _get_batch_meta_from_hash
+
+
+def _get_obj_label(obj: pyds.NvDsObjectMeta) -> str:
+    """Best-effort label (only used until the person class id is known)."""
+    try:
+        return pyds.get_string(obj.obj_label).strip().lower()
+    except Exception:
+        return ""
+
+
+class OsdProbe:
+    """
+    Callable pad probe (register with pad.add_probe(..., probe, osd)).
+
+    Runs on the streaming thread; it never starts Smart Record itself. When a source
+    shows a person and its cooldown has elapsed, pending[sid] is set and the main loop
+    does the actual SRM.start().
+    """
+
+    def __init__(self, person_ids: Iterable[int], min_conf: float, cooldown_ns: int, num_sources: int):
+        self.person_ids: FrozenSet[int] = frozenset(int(c) for c in person_ids)
+        # False until the "person" class id is known (labels file or first labelled object)
+        self.person_ids_known: bool = False
+        self.min_conf: float = float(min_conf)
+        self.cooldown_ns: int = int(cooldown_ns)
+
+        # Per source (sid): PTS of the last auto-trigger, and the main-loop hand-off flag
+        self.last_trigger_pts: List[Optional[int]] = []
+        self.pending: List[threading.Event] = []
+        self.set_num_sources(num_sources)
+
+        # Last display-text state set on nvdsosd (it starts enabled)
+        self.osd_text_on: bool = True
+
+    def set_num_sources(self, num_sources: int) -> None:
+        """Size the per-source state for num_sources (call before the pipeline starts)."""
+        self.last_trigger_pts = [None] * num_sources
+        self.pending = [threading.Event() for _ in range(num_sources)]
+
+    def add_person_ids(self, ids: Iterable[int]) -> None:
+        """Merge known "person" class ids and stop decoding labels."""
+        self.person_ids = self.person_ids | frozenset(int(c) for c in ids)
+        self.person_ids_known = True
+
+    # ------------------------------------------------------------------
+    # Hot path
+    # ------------------------------------------------------------------
+
+    def scan_frame_objects(self, frame_meta: pyds.NvDsFrameMeta) -> bool:
+        """
+        Walk one frame's obj_meta_list in Python (one cast per object). Returns True if at least one person box is shown.
+
+        Only frames without detections are skipped wholesale (num_obj_meta). There is no bulk
+        extraction: pyds has no array accessor for object meta, and every hidden box still
+        needs its own border/text write, which is most of the per-object cost anyway.
+        """
+        # Most frames carry no detections at all; skip the list walk entirely.
+        if frame_meta.num_obj_meta == 0:
+            return False
+
+        # Bind hot-path attributes to locals once per frame
+        _pids = self.person_ids
+        _learning = not self.person_ids_known
+        _min = self.min_conf
+        _cast = pyds.NvDsObjectMeta.cast
+        _labels = _CONF_LABELS
+
+        saw_person = False
+
+        l_obj = frame_meta.obj_meta_list
+        while l_obj is not None:
+            # Not cached per address: pyds hands l_obj.data out as a fresh PyCapsule, so a
+            # pointer-keyed wrapper cache would cost a capsule unwrap per object just to
+            # save the (equally cheap) non-owning cast below.
+            obj = _cast(l_obj.data)
+
+            try:
+                is_person = obj.class_id in _pids
+                if _learning and not is_person and _get_obj_label(obj) == "person":
+                    # Labels file was unreadable: decode labels only until "person" is found once
+                    self.add_person_ids((obj.class_id,))
+                    print(f"[PGIE] Learned person class id {obj.class_id} from object labels.")
+                    _learning = False
+                    is_person = True
+                conf = obj.confidence
+
+                # Hide everything by default
+                if not (is_person and conf >= _min):
+                    obj.rect_params.border_width = 0
+                    obj.text_params.display_text = ""
+                else:
+                    saw_person = True
+                    obj.rect_params.border_width = 3
+                    # Keep default OSD border color; you can set it if you want.
+                    obj.text_params.display_text = _labels[min(1000, int(conf * 1000.0 + 0.5))]
+            except Exception:
+                # Never crash the pipeline on overlay issues
+                pass
+
+            l_obj = l_obj.next
+
+        return saw_person
+
+    def process_batch(self, buf: Gst.Buffer) -> bool:
+        """Overlay filtering + auto-trigger request for one batched GstBuffer. Returns True if a person is shown."""
+        batch_meta = _get_batch_meta(buf)
+        if not batch_meta:
+            return False
+
+        _frame_cast = pyds.NvDsFrameMeta.cast
+        _last = self.last_trigger_pts
+        _pending = self.pending
+        _cooldown = self.cooldown_ns
+        saw_person = False
+
+        l_frame = batch_meta.frame_meta_list
+        while l_frame is not None:
+            frame_meta = _frame_cast(l_frame.data)
+
+            if self.scan_frame_objects(frame_meta):
+                saw_person = True
+                sid = frame_meta.pad_index
+                # Cooldown on the source frame PTS (same timeline NvDsSR uses for its cache);
+                # a PTS that went backwards (flush/restart) re-arms the trigger.
+                now_pts = frame_meta.buf_pts
+                if sid < len(_last) and now_pts != Gst.CLOCK_TIME_NONE:
+                    last_pts = _last[sid]
+                    if last_pts is None or now_pts < last_pts or (now_pts - last_pts) >= _cooldown:
+                        _last[sid] = now_pts
+                        _pending[sid].set()
+
+            l_frame = l_frame.next
+
+        return saw_person
+
+    def __call__(self, _pad: Gst.Pad, info: Gst.PadProbeInfo, osd: Optional[Gst.Element]) -> Gst.PadProbeReturn:
+        """Runs on each batch at nvdsosd sink (a single GstBuffer or a GstBufferList)."""
+        saw_person = False
+        buf_list = info.get_buffer_list()
+        if buf_list is not None:
+            for i in range(buf_list.length()):
+                if self.process_batch(buf_list.get(i)):
+                    saw_person = True
+        else:
+            buf = info.get_buffer()
+            if buf:
+                saw_person = self.process_batch(buf)
+
+        # No visible person -> no text to draw: skip nvdsosd's text pass on those frames.
+        # Set right here on the streaming thread, before this batch reaches nvdsosd, so the
+        # batch that shows (or loses) the first person is drawn accordingly; only on state changes.
+        if osd is not None and saw_person != self.osd_text_on:
+            self.osd_text_on = saw_person
+            osd.set_property("display-text", saw_person)
+
+        return Gst.PadProbeReturn.OK
@@ -8,23 +8,82 @@ Supports two modes:
 2) Manual NvDsSR (ctypes bindings) for sources that don't support built-in SR (e.g., USB/v4l2)
 
 This module is designed to be imported and used from Forklift.py.
+
+The per-trigger path is a single prototyped ctypes call (see _make_manual_impls).
 """
 
 from __future__ import annotations
 
+import atexit
 import ctypes
+import functools
+import itertools
+import logging
+import logging.handlers
 import os
+import queue
+import struct
+import sys
 import time
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
 
 import gi
 
 gi.require_version("Gst", "1.0")
-from gi.repository import Gst  # noqa: E402
+from gi.repository import GLib, GObject, Gst  # noqa: E402
 
 import pyds  # noqa: E402
 
+# -----------------------------------------------------------------------------
+# Logging: records go to the "smartrec" logger. Nothing is configured at import; the
+# application sets level/propagation and may call init_logging() to get the queued
+# stdout handler below.
+# -----------------------------------------------------------------------------
+
+_log = logging.getLogger("smartrec")
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class _RawQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the record untouched.
+
+    The stock prepare() calls self.format(record) on the emitting thread; skipping it
+    leaves all formatting to the listener. Safe here: the records only carry str/int
+    args and no exc_info.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def init_logging(stream=None) -> None:
+    """
+    Attach a queued stdout handler to the "smartrec" logger (idempotent).
+
+    sr-done callbacks run on GStreamer/NvDsSR threads, so they only enqueue the record;
+    a QueueListener thread does the formatting and the (possibly slow) stream write.
+    Level and propagation are left to the application.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    out = logging.StreamHandler(stream or sys.stdout)
+    out.setFormatter(logging.Formatter("%(message)s"))
+    _log_listener = logging.handlers.QueueListener(log_queue, out)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)  # flush pending records on exit
+    _log.addHandler(_RawQueueHandler(log_queue))
+
+
+# Hot-path aliases (one module-global lookup instead of an attribute chain per call).
+# NvDsSRRecordingInfo is missing from some pyds builds (calling None -> TypeError, handled by the callbacks).
+_monotonic = time.monotonic
+_NvDsSRRecordingInfo_cast = getattr(getattr(pyds, "NvDsSRRecordingInfo", None), "cast", None)
+_pyds_get_string = pyds.get_string
+
 # -----------------------------------------------------------------------------
 # NvDsSR library loading
 # -----------------------------------------------------------------------------
@@ -42,6 +101,25 @@ for _path in _LIB_CANDIDATES:
     except OSError:
         _libnvds_sr = None
 
+# libgstreamer (for linking the NvDsSR recordbin, which GI can't wrap)
+try:
+    _libgst = ctypes.CDLL("libgstreamer-1.0.so.0")
+except OSError:
+    _libgst = None
+
+if _libgst:
+    _gst_bin_add = _libgst.gst_bin_add
+    _gst_bin_add.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    _gst_bin_add.restype = ctypes.c_bool
+
+    _gst_element_link = _libgst.gst_element_link
+    _gst_element_link.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    _gst_element_link.restype = ctypes.c_bool
+
+    _gst_element_sync_state_with_parent = _libgst.gst_element_sync_state_with_parent
+    _gst_element_sync_state_with_parent.argtypes = [ctypes.c_void_p]
+    _gst_element_sync_state_with_parent.restype = ctypes.c_bool
+
 # -----------------------------------------------------------------------------
 # ctypes structures / bindings
 # -----------------------------------------------------------------------------
@@ -52,6 +130,8 @@ NVDSSR_CONTAINER_MKV = 1
 
 SR_CALLBACK_FUNC = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_void_p)
 
+_SESSION_BUF_SIZE = 4  # guint session id written by nvurisrcbin start-sr
+
 
 class NvDsSRInitParams(ctypes.Structure):
     _fields_ = [
@@ -84,29 +164,70 @@ class NvDsSRContext(ctypes.Structure):
 
 
 class SRUserContext(ctypes.Structure):
+    """Our own user_data for start-sr / NvDsSRStart (opaque to DeepStream, handed back in sr-done)."""
     _fields_ = [
         ("sessionid", ctypes.c_int),
-        ("name", ctypes.c_char * 32),
+        ("name", ctypes.c_char * 32),  # label of the current trigger (rewritten by start())
+        ("source", ctypes.c_char * 32),  # camera name from attach_source() (never rewritten)
     ]
 
 
+# SRUserContext.sessionid source: unique per attach (C-level increment, no clock read)
+_sid_counter = itertools.count(1)
+
+_NAME_OFFSET = SRUserContext.name.offset
+_NAME_SIZE = SRUserContext.name.size
+
+# Precompiled packers writing SRUserContext straight into its native bytes (no ctypes field descriptors)
+_UCTX_STRUCT = struct.Struct(f"=i{_NAME_SIZE}s{SRUserContext.source.size}s")
+if _UCTX_STRUCT.size != ctypes.sizeof(SRUserContext):  # not an assert: must survive python -O
+    raise RuntimeError(
+        f"SRUserContext packer layout ({_UCTX_STRUCT.size} bytes) does not match the ctypes struct "
+        f"({ctypes.sizeof(SRUserContext)} bytes)"
+    )
+_pack_uctx = _UCTX_STRUCT.pack_into
+_pack_uctx_name = struct.Struct(f"{_NAME_SIZE}s").pack_into
+
+
+@functools.lru_cache(maxsize=64)
+def _encode_label(label: str) -> bytes:
+    """UTF-8 label truncated to 31 bytes and NUL-padded to fill SRUserContext.name/.source (apps reuse a few labels)."""
+    return label.encode("utf-8")[: _NAME_SIZE - 1].ljust(_NAME_SIZE, b"\0")
+
+
+_PyCapsule_GetPointer = ctypes.pythonapi.PyCapsule_GetPointer
+_PyCapsule_GetPointer.restype = ctypes.c_void_p
+_PyCapsule_GetPointer.argtypes = [ctypes.py_object, ctypes.c_char_p]
+
+
 def _capsule_ptr(capsule) -> int:
     """
     pyds.get_native_ptr() returns a PyCapsule.
-    We need the raw address for ctypes operations.
+    We need the raw address for ctypes operations (0 for None).
     """
     if capsule is None:
         return 0
-    try:
-        ctypes.pythonapi.PyCapsule_GetPointer.restype = ctypes.c_void_p
-        ctypes.pythonapi.PyCapsule_GetPointer.argtypes = [ctypes.py_object, ctypes.c_char_p]
-        return int(ctypes.pythonapi.PyCapsule_GetPointer(capsule, None) or 0)
-    except Exception:
-        # Fallback: hash() often maps to the underlying pointer for GI objects, but not guaranteed.
-        try:
-            return int(hash(capsule))
-        except Exception:
-            return 0
+    return int(_PyCapsule_GetPointer(capsule, None) or 0)
+
+
+def _gst_ptr(obj) -> int:
+    """
+    Raw C address of a PyGObject wrapper (GstElement/GstBin) or of a gpointer signal argument.
+
+    PyGObject exposes the wrapped pointer as a PyCapsule on obj.__gpointer__; gpointer
+    signal arguments arrive as an int or a bare capsule. hash() (which PyGObject happens
+    to map to the same address) is only the last resort.
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, int):
+        return obj
+    capsule = getattr(obj, "__gpointer__", None)
+    if capsule is None and type(obj).__name__ == "PyCapsule":
+        capsule = obj
+    if capsule is not None:
+        return _capsule_ptr(capsule)
+    return int(hash(obj))
 
 
 if _libnvds_sr:
@@ -128,21 +249,95 @@ if _libnvds_sr:
     _libnvds_sr.NvDsSRDestroy.argtypes = [ctypes.POINTER(NvDsSRContext)]
     _libnvds_sr.NvDsSRDestroy.restype = ctypes.c_int
 
+# Prototyped function pointers, resolved once (each CDLL attribute access is a dict lookup)
+_NvDsSRCreate = _libnvds_sr.NvDsSRCreate if _libnvds_sr else None
+_NvDsSRStart = _libnvds_sr.NvDsSRStart if _libnvds_sr else None
+_NvDsSRStop = _libnvds_sr.NvDsSRStop if _libnvds_sr else None
+_NvDsSRDestroy = _libnvds_sr.NvDsSRDestroy if _libnvds_sr else None
+
+
+# Property names / "sr-done" availability per element GType. Looked up lazily on the first
+# attach of each type (this module is imported before Gst.init(), so not at import time).
+_PROPS_BY_GTYPE: Dict[object, FrozenSet[str]] = {}
+_HAS_SR_DONE_BY_GTYPE: Dict[object, bool] = {}
+
+
+def _element_props(elem: Gst.Element) -> FrozenSet[str]:
+    """Names of the GObject properties of elem's type (introspected once per type)."""
+    gtype = elem.__gtype__
+    props = _PROPS_BY_GTYPE.get(gtype)
+    if props is None:
+        props = frozenset(p.name for p in GObject.list_properties(gtype))
+        _PROPS_BY_GTYPE[gtype] = props
+    return props
+
+
+def _has_sr_done(elem: Gst.Element) -> bool:
+    """True if elem's type emits the "sr-done" signal (looked up once per type)."""
+    gtype = elem.__gtype__
+    has = _HAS_SR_DONE_BY_GTYPE.get(gtype)
+    if has is None:
+        has = GObject.signal_lookup("sr-done", gtype) != 0
+        _HAS_SR_DONE_BY_GTYPE[gtype] = has
+    return has
+
 
 @dataclass
 class _NativeBuffers:
     """Holds gbuffer objects so they stay alive for the lifetime of the SR attachment."""
-    session_gbuf: object
+    session_gbuf: Optional[object]  # nvurisrcbin mode only
     uctx_gbuf: object
     params_gbuf: Optional[object] = None
 
 
+class _Session:
+    """Per-source state; start()/stop() resolve it with a single dict lookup."""
+
+    __slots__ = (
+        "sid",
+        "nvuri",  # nvurisrcbin mode: the element
+        "sr_done_handler",  # nvurisrcbin mode: "sr-done" handler id (0 = not connected)
+        "recording",  # nvurisrcbin mode: start-sr issued and no sr-done seen yet
+        "detached",  # detach_source() ran while recording; buffers recycled on sr-done
+        "manual_ctx",  # manual mode: POINTER(NvDsSRContext)
+        "native",  # _NativeBuffers (kept alive, recycled on detach)
+        "sess_cap",  # PyCapsules required by nvurisrcbin start-sr / stop-sr
+        "uctx_cap",
+        "uctx_ptr",  # raw SRUserContext address (manual user_data)
+        "uctx_mv",  # writable c_ubyte view over the SRUserContext (for struct.pack_into)
+        "prefix_bytes",  # manual mode: InitParams.fileNamePrefix points at these bytes
+        "start_sr_with_uctx",  # whether start-sr accepts the user_ctx capsule (None until first start)
+        "last_fire",  # monotonic() of the last successful start
+        "start_impl",  # start/stop implementation (manual NvDsSR or nvurisrcbin), chosen at attach time
+        "stop_impl",
+    )
+
+    def __init__(self, sid: int, native: _NativeBuffers, uctx_cap: object, uctx_ptr: int, uctx_mv: ctypes.Array):
+        self.sid = sid
+        self.nvuri: Optional[Gst.Element] = None
+        self.sr_done_handler: int = 0
+        self.recording: bool = False
+        self.detached: bool = False
+        self.manual_ctx = None
+        self.native = native
+        self.sess_cap: Optional[object] = None
+        self.uctx_cap = uctx_cap
+        self.uctx_ptr = uctx_ptr
+        self.uctx_mv = uctx_mv
+        self.prefix_bytes: Optional[bytes] = None
+        self.start_sr_with_uctx: Optional[bool] = None
+        self.last_fire: float = 0.0
+        self.start_impl: Optional[Callable[["_Session", int, int], bool]] = None
+        self.stop_impl: Optional[Callable[["_Session"], bool]] = None
+
+
 class SmartRecManager:
     """
     Smart Record manager.
 
     - attach_source(sid, nvurisrcbin, is_manual=False): enables built-in Smart Record
     - attach_source(sid, tee_or_any, is_manual=True): creates a manual NvDsSR context and returns recordbin_ptr (int)
+    - detach_source(sid): forgets a source and recycles its native buffers (after sr-done if still recording)
 
     start(sid, back_sec, front_sec): starts recording
     stop(sid): stops recording
@@ -152,35 +347,57 @@ class SmartRecManager:
         self._record_dir = os.path.abspath(record_dir)
         self._cache_sec = int(cache_sec)
         self._prefix = str(file_prefix)
+        # Encoded once; NvDsSR InitParams only hold char* pointers to these
+        self._dirpath_bytes = self._record_dir.encode("utf-8")
 
         os.makedirs(self._record_dir, exist_ok=True)
 
-        # nvurisrcbin mode
-        self._nvuri_by_sid: Dict[int, Gst.Element] = {}
-
-        # manual mode: store POINTER(NvDsSRContext)
-        self._manual_ctx_by_sid: Dict[int, ctypes.POINTER(NvDsSRContext)] = {}
-
-        # Keep native buffers alive (session id + user ctx + init params)
-        self._native: Dict[int, _NativeBuffers] = {}
-
-        # Keep the PyCapsules (required by nvurisrcbin start-sr / stop-sr)
-        self._session_capsule: Dict[int, object] = {}
-        self._uctx_capsule: Dict[int, object] = {}
-
-        # Raw pointers for manual mode (ctypes)
-        self._uctx_raw_ptr: Dict[int, int] = {}
+        # Attached sources (nvurisrcbin or manual NvDsSR), keyed by sid
+        self._sessions: Dict[int, _Session] = {}
 
         # Optional anti-spam
         self._cooldown_s: float = 0.0
-        self._last_fire: Dict[int, float] = {}
 
-        # Keep C callback references alive (important!)
-        self._c_callbacks: Dict[int, object] = {}
+        # One C callback shared by every manual context (keep the reference alive - important!).
+        # The finishing session is identified from the SRUserContext passed as user_data.
+        self._shared_cb = SR_CALLBACK_FUNC(SmartRecManager._on_manual_done_c)
+
+        # Free-list of detached pyds.alloc_buffer() gbuffers, keyed by size (reused on re-attach)
+        self._buf_pool: Dict[int, List[object]] = {}
+        # Detached nvurisrcbin sessions whose element may still use their buffers (recycled on sr-done)
+        self._retired: List[_Session] = []
+
+        # NvDsSRStart session-id out-param, allocated once and reused by every trigger
+        self._sr_session_out = ctypes.c_uint(0)
+        self._sr_session_ref = ctypes.byref(self._sr_session_out)
 
     def set_cooldown(self, seconds: float) -> None:
         self._cooldown_s = max(0.0, float(seconds))
 
+    # ------------------------------------------------------------------
+    # Native buffer pool
+    # ------------------------------------------------------------------
+
+    def _acquire_buf(self, size: int) -> Tuple[object, object, int]:
+        """Return a zeroed (gbuffer, capsule, raw_ptr) of `size` bytes, reusing a pooled one if possible."""
+        pool = self._buf_pool.get(size)
+        gbuf = pool.pop() if pool else pyds.alloc_buffer(size)
+        capsule = pyds.get_native_ptr(gbuf)
+        ptr = _capsule_ptr(capsule)
+        if ptr:
+            ctypes.memset(ptr, 0, size)
+        return gbuf, capsule, ptr
+
+    def _release_native(self, native: _NativeBuffers) -> None:
+        """Return the gbuffers of a detached session to the pool."""
+        for gbuf, size in (
+            (native.session_gbuf, _SESSION_BUF_SIZE),
+            (native.uctx_gbuf, ctypes.sizeof(SRUserContext)),
+            (native.params_gbuf, ctypes.sizeof(NvDsSRInitParams)),
+        ):
+            if gbuf is not None:
+                self._buf_pool.setdefault(size, []).append(gbuf)
+
     # ------------------------------------------------------------------
     # Wiring / attachment
     # ------------------------------------------------------------------
@@ -200,50 +417,44 @@ class SmartRecManager:
         if not isinstance(source_elem, Gst.Element):
             raise TypeError("attach_source expects a Gst.Element")
 
-        # Allocate native buffers for session id and SRUserContext
-        sess_g = pyds.alloc_buffer(4)
-        sess_capsule = pyds.get_native_ptr(sess_g)
-
-        uctx_size = ctypes.sizeof(SRUserContext)
-        uctx_g = pyds.alloc_buffer(uctx_size)
-        uctx_capsule = pyds.get_native_ptr(uctx_g)
-
-        uctx_ptr = _capsule_ptr(uctx_capsule)
+        # Allocate the native SRUserContext (both modes)
+        uctx_g, uctx_capsule, uctx_ptr = self._acquire_buf(ctypes.sizeof(SRUserContext))
         if uctx_ptr == 0:
             raise RuntimeError("Failed to obtain raw pointer for SRUserContext")
 
         # Initialize SRUserContext contents
-        sr = ctypes.cast(uctx_ptr, ctypes.POINTER(SRUserContext)).contents
-        sr.sessionid = int(time.time()) & 0x7FFFFFFF
-        name = (friendly_name or f"sid{sid}").encode("utf-8")[:31]
-        sr.name = name.ljust(31, b"\0")
+        uctx_mv = (ctypes.c_ubyte * _UCTX_STRUCT.size).from_address(uctx_ptr)
+        source_name = _encode_label(friendly_name or f"sid{sid}")
+        _pack_uctx(uctx_mv, 0, next(_sid_counter) & 0x7FFFFFFF, source_name, source_name)
 
-        self._native[sid] = _NativeBuffers(session_gbuf=sess_g, uctx_gbuf=uctx_g)
-        self._session_capsule[sid] = sess_capsule
-        self._uctx_capsule[sid] = uctx_capsule
-        self._uctx_raw_ptr[sid] = uctx_ptr
+        native = _NativeBuffers(session_gbuf=None, uctx_gbuf=uctx_g)
+        sess = _Session(sid, native, uctx_capsule, uctx_ptr, uctx_mv)
+        self._sessions[sid] = sess
 
         if not is_manual:
             # nvurisrcbin mode
+            # start-sr writes the session id into a native guint; NvDsSRStart (manual) doesn't need one
+            sess_g, sess_capsule, _ = self._acquire_buf(_SESSION_BUF_SIZE)
+            native.session_gbuf = sess_g
+            sess.sess_cap = sess_capsule
+
             nv = source_elem
+            props = _element_props(nv)
             nv.set_property("smart-record", 2)
             nv.set_property("smart-rec-dir-path", self._record_dir)
-            try:
+            if "smart-rec-cache" in props:
                 nv.set_property("smart-rec-cache", self._cache_sec)
-            except Exception:
-                pass
-            try:
+            if "smart-rec-file-prefix" in props:
                 nv.set_property("smart-rec-file-prefix", f"{self._prefix}{sid}_")
-            except Exception:
-                pass
 
-            self._nvuri_by_sid[sid] = nv
+            sess.nvuri = nv
+            sess.start_impl = self._start_nvuri
+            sess.stop_impl = self._stop_nvuri
 
             # Optional: print file info when done
-            try:
-                nv.connect("sr-done", self._on_nvuri_done, sid)
-            except Exception:
-                pass
+            # (also tells us when the element is done with the session/uctx buffers)
+            if _has_sr_done(nv):
+                sess.sr_done_handler = nv.connect("sr-done", self._on_nvuri_done, sess)
 
             return None
 
@@ -252,38 +463,40 @@ class SmartRecManager:
             print("[SmartRec] WARNING: NvDsSR library not found; manual SR is disabled.")
             return None
 
-        params_size = ctypes.sizeof(NvDsSRInitParams)
-        params_g = pyds.alloc_buffer(params_size)
-        params_capsule = pyds.get_native_ptr(params_g)
-        params_ptr = _capsule_ptr(params_capsule)
+        params_g, _params_capsule, params_ptr = self._acquire_buf(ctypes.sizeof(NvDsSRInitParams))
         if params_ptr == 0:
             print("[SmartRec] ERROR: Failed to get InitParams raw pointer.")
             return None
 
         # Keep params buffer alive
-        self._native[sid].params_gbuf = params_g
-
-        # Create (and pin) callback
-        cb = SR_CALLBACK_FUNC(self._on_manual_done_c)
-        self._c_callbacks[sid] = cb
-
-        init_params = ctypes.cast(params_ptr, ctypes.POINTER(NvDsSRInitParams)).contents
-        init_params.callback = cb
-        init_params.containerType = NVDSSR_CONTAINER_MP4
-        init_params.width = 0
-        init_params.height = 0
-        init_params.fileNamePrefix = f"{self._prefix}{sid}_".encode("utf-8")
-        init_params.dirpath = self._record_dir.encode("utf-8")
-        init_params.defaultDuration = 10
-        init_params.cacheSize = self._cache_sec
+        native.params_gbuf = params_g
+        params_typed = ctypes.cast(params_ptr, ctypes.POINTER(NvDsSRInitParams))  # what NvDsSRCreate takes
+
+        prefix_bytes = f"{self._prefix}{sid}_".encode("utf-8")
+        sess.prefix_bytes = prefix_bytes
+
+        # Build the struct in one constructor call and copy it into the native buffer.
+        # Its char*/callback fields point at objects this manager keeps alive.
+        init_params = NvDsSRInitParams(
+            self._shared_cb,
+            NVDSSR_CONTAINER_MP4,
+            0,  # width  (0 = from stream)
+            0,  # height (0 = from stream)
+            prefix_bytes,
+            self._dirpath_bytes,
+            10,  # defaultDuration
+            self._cache_sec,
+        )
+        ctypes.memmove(params_ptr, ctypes.addressof(init_params), ctypes.sizeof(NvDsSRInitParams))
 
         ctx_ptr = ctypes.POINTER(NvDsSRContext)()
-        ret = _libnvds_sr.NvDsSRCreate(ctypes.byref(ctx_ptr), ctypes.cast(params_ptr, ctypes.POINTER(NvDsSRInitParams)))
+        ret = _NvDsSRCreate(ctypes.byref(ctx_ptr), params_typed)
         if ret != 0 or not ctx_ptr:
             print(f"[SmartRec] ERROR: NvDsSRCreate failed (sid={sid}, ret={ret}).")
             return None
 
-        self._manual_ctx_by_sid[sid] = ctx_ptr
+        sess.manual_ctx = ctx_ptr
+        sess.start_impl, sess.stop_impl = self._make_manual_impls(ctx_ptr, uctx_ptr)
         recordbin_ptr = int(ctx_ptr.contents.recordbin or 0)
         return recordbin_ptr or None
 
@@ -298,39 +511,59 @@ class SmartRecManager:
         - back_sec: seconds in the past (uses Smart Record circular cache)
         - front_sec: seconds after trigger
         """
-        if self._cooldown_s > 0:
-            last = self._last_fire.get(sid, 0.0)
-            now = time.monotonic()
-            if now - last < self._cooldown_s:
-                return False
+        sess = self._sessions.get(sid)
+        if sess is None:
+            return False
+        impl = sess.start_impl
+        if impl is None:
+            return False  # manual SR unavailable for this source
+
+        cooldown = self._cooldown_s
+        if cooldown and (_monotonic() - sess.last_fire) < cooldown:
+            return False
 
         # Update label (stored in SRUserContext)
-        if label and sid in self._uctx_raw_ptr:
-            try:
-                uctx_ptr = self._uctx_raw_ptr[sid]
-                sr = ctypes.cast(uctx_ptr, ctypes.POINTER(SRUserContext)).contents
-                nm = label.encode("utf-8")[:31]
-                sr.name = nm.ljust(31, b"\0")
-            except Exception:
-                pass
+        if label:
+            _pack_uctx_name(sess.uctx_mv, _NAME_OFFSET, _encode_label(label))
 
-        # Manual mode
-        if sid in self._manual_ctx_by_sid and _libnvds_sr:
-            ctx = self._manual_ctx_by_sid[sid]
-            session_id = ctypes.c_uint(0)
-            total_dur = int(back_sec) + int(front_sec)
-            user_data = ctypes.c_void_p(int(self._uctx_raw_ptr.get(sid, 0)) or 0)
-
-            ret = _libnvds_sr.NvDsSRStart(ctx, ctypes.byref(session_id), int(back_sec), int(total_dur), user_data)
-            if ret == 0:
-                self._last_fire[sid] = time.monotonic()
-                return True
-            return False
+        if impl(sess, back_sec, front_sec):
+            sess.last_fire = _monotonic()
+            return True
+        return False
 
-        # nvurisrcbin mode
-        nv = self._nvuri_by_sid.get(sid)
-        if nv is None:
+    def stop(self, sid: int) -> bool:
+        """Stop recording (best-effort)."""
+        sess = self._sessions.get(sid)
+        if sess is None or sess.stop_impl is None:
             return False
+        return sess.stop_impl(sess)
+
+    # start/stop implementations, bound per session by attach_source()
+
+    def _make_manual_impls(self, ctx_ptr, uctx_ptr: int) -> Tuple[Callable[[_Session, int, int], bool], Callable[[_Session], bool]]:
+        """
+        start/stop closures for one manual NvDsSR session.
+
+        The context, session-id out-param and user_data are captured as closure constants,
+        so a trigger is a single prototyped C call with no per-call lookups.
+        """
+        _start_c = _NvDsSRStart
+        _stop_c = _NvDsSRStop
+        session_ref = self._sr_session_ref
+        user_data = uctx_ptr or None
+
+        def start_manual(_sess: _Session, back_sec: int, front_sec: int) -> bool:
+            back = int(back_sec)
+            return _start_c(ctx_ptr, session_ref, back, back + int(front_sec), user_data) == 0
+
+        def stop_manual(_sess: _Session) -> bool:
+            return _stop_c(ctx_ptr, 0) == 0
+
+        return start_manual, stop_manual
+
+    @staticmethod
+    def _start_nvuri(sess: _Session, back_sec: int, front_sec: int) -> bool:
+        nv = sess.nvuri
 
         # Respect cache size if readable
         try:
@@ -340,35 +573,28 @@ class SmartRecManager:
         except Exception:
             pass
 
-        sess_caps = self._session_capsule.get(sid)
-        uctx_caps = self._uctx_capsule.get(sid)
+        sess_caps = sess.sess_cap
 
+        # Some builds require user_ctx=None; probe that once per source, then emit the known-good form
+        pass_uctx = sess.start_sr_with_uctx
         try:
-            nv.emit("start-sr", sess_caps, int(back_sec), int(front_sec), uctx_caps)
-            self._last_fire[sid] = time.monotonic()
+            if pass_uctx is None:
+                try:
+                    nv.emit("start-sr", sess_caps, int(back_sec), int(front_sec), sess.uctx_cap)
+                    sess.start_sr_with_uctx = True
+                except TypeError:
+                    nv.emit("start-sr", sess_caps, int(back_sec), int(front_sec), None)
+                    sess.start_sr_with_uctx = False
+            else:
+                nv.emit("start-sr", sess_caps, int(back_sec), int(front_sec), sess.uctx_cap if pass_uctx else None)
+            sess.recording = True
             return True
-        except TypeError:
-            # Some builds require user_ctx=None
-            try:
-                nv.emit("start-sr", sess_caps, int(back_sec), int(front_sec), None)
-                self._last_fire[sid] = time.monotonic()
-                return True
-            except Exception:
-                return False
         except Exception:
             return False
 
-    def stop(self, sid: int) -> bool:
-        """Stop recording (best-effort)."""
-        if sid in self._manual_ctx_by_sid and _libnvds_sr:
-            ctx = self._manual_ctx_by_sid[sid]
-            ret = _libnvds_sr.NvDsSRStop(ctx, 0)
-            return ret == 0
-
-        nv = self._nvuri_by_sid.get(sid)
-        if nv is None:
-            return False
-
+    @staticmethod
+    def _stop_nvuri(sess: _Session) -> bool:
+        nv = sess.nvuri
         try:
             try:
                 nv.emit("stop-sr", 0)
@@ -388,78 +614,102 @@ class SmartRecManager:
         if not recordbin_ptr:
             return False
 
-        try:
-            libgst = ctypes.CDLL("libgstreamer-1.0.so.0")
-        except OSError:
+        if _libgst is None:
             print("[SmartRec] ERROR: Could not load libgstreamer-1.0.so.0")
             return False
 
-        libgst.gst_bin_add.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
-        libgst.gst_bin_add.restype = ctypes.c_bool
-
-        libgst.gst_element_link.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
-        libgst.gst_element_link.restype = ctypes.c_bool
-
-        libgst.gst_element_sync_state_with_parent.argtypes = [ctypes.c_void_p]
-        libgst.gst_element_sync_state_with_parent.restype = ctypes.c_bool
-
-        # In PyGObject, hash(obj) usually returns the underlying GObject pointer value.
-        bin_ptr = ctypes.c_void_p(int(hash(gst_bin)))
-        src_ptr = ctypes.c_void_p(int(hash(source_elem)))
+        bin_ptr = ctypes.c_void_p(_gst_ptr(gst_bin))
+        src_ptr = ctypes.c_void_p(_gst_ptr(source_elem))
         rec_ptr = ctypes.c_void_p(int(recordbin_ptr))
 
-        if not libgst.gst_bin_add(bin_ptr, rec_ptr):
+        if not _gst_bin_add(bin_ptr, rec_ptr):
             return False
-        if not libgst.gst_element_link(src_ptr, rec_ptr):
+        if not _gst_element_link(src_ptr, rec_ptr):
             return False
 
-        libgst.gst_element_sync_state_with_parent(rec_ptr)
+        _gst_element_sync_state_with_parent(rec_ptr)
         return True
 
+    def _destroy_session(self, sess: _Session) -> None:
+        """Destroy a session's manual context / sr-done handler (best-effort) and recycle its native buffers."""
+        if sess.manual_ctx is not None and _NvDsSRDestroy:
+            try:
+                _NvDsSRDestroy(sess.manual_ctx)
+            except Exception:
+                pass
+        if sess.sr_done_handler:
+            sess.nvuri.disconnect(sess.sr_done_handler)
+            sess.sr_done_handler = 0
+        self._release_native(sess.native)
+
+    def detach_source(self, sid: int) -> None:
+        """
+        Forget a source (e.g. a hot-unplugged camera) so its sid can be attached again.
+
+        Manual mode: destroys the NvDsSR context, so remove its recordbin from the pipeline first.
+        nvurisrcbin mode: start-sr handed the element our session/SRUserContext buffers. If a
+        recording may still be running, it is stopped and the buffers are only recycled once
+        its sr-done arrives (never, if this nvurisrcbin has no sr-done signal).
+        Otherwise the native buffers go back to the pool for the next attach_source().
+        """
+        sess = self._sessions.pop(sid, None)
+        if sess is None:
+            return
+        if sess.nvuri is not None and sess.recording:
+            sess.detached = True
+            self._retired.append(sess)  # keep the buffers alive, but don't reuse them yet
+            self._stop_nvuri(sess)
+            return
+        self._destroy_session(sess)
+
     def cleanup(self) -> None:
-        """Destroy manual SR contexts (best-effort)."""
-        if _libnvds_sr:
-            for sid, ctx in list(self._manual_ctx_by_sid.items()):
-                try:
-                    _libnvds_sr.NvDsSRDestroy(ctx)
-                except Exception:
-                    pass
-        self._manual_ctx_by_sid.clear()
-        self._nvuri_by_sid.clear()
-        self._native.clear()
-        self._session_capsule.clear()
-        self._uctx_capsule.clear()
-        self._uctx_raw_ptr.clear()
-        self._c_callbacks.clear()
+        """Destroy manual SR contexts (best-effort). Call after the pipeline reached NULL."""
+        for sess in list(self._sessions.values()) + self._retired:
+            self._destroy_session(sess)
+        self._sessions.clear()
+        self._retired.clear()
 
     # ------------------------------------------------------------------
     # Callbacks
     # ------------------------------------------------------------------
 
-    def _on_nvuri_done(self, _nvurisrcbin, recordingInfo, _user_ctx, sid: int) -> None:
+    def _on_nvuri_done(self, _nvurisrcbin, recordingInfo, _user_ctx, sess: _Session) -> None:
         """nvurisrcbin sr-done callback (prints file info if available)."""
+        sess.recording = False
+        # Only the pyds calls can fail (cast missing from this pyds build, or no string helper)
         try:
-            info = pyds.NvDsSRRecordingInfo.cast(hash(recordingInfo))
-            try:
-                dirp = pyds.get_string(info.dirpath)
-                filep = pyds.get_string(info.filename)
-            except Exception:
-                dirp = getattr(info, "dirpath", b"")
-                filep = getattr(info, "filename", b"")
-            print(f"[SR DONE] sid={sid} file={filep} dir={dirp}")
-        except Exception as e:
-            print("[SR DONE] error:", e)
-
-    def _on_manual_done_c(self, info_p, _user_data_p) -> None:
-        """Manual NvDsSR callback (best-effort)."""
+            info = _NvDsSRRecordingInfo_cast(_gst_ptr(recordingInfo))
+            dirp = _pyds_get_string(info.dirpath)
+            filep = _pyds_get_string(info.filename)
+        except (AttributeError, TypeError):
+            dirp = filep = "?"
+        _log.info("[SR DONE] sid=%s file=%s dir=%s", sess.sid, filep, dirp)
+
+        # Detached while recording: the element is done with the buffers now
+        if sess.detached:
+            GLib.idle_add(self._finish_detach, sess)
+
+    def _finish_detach(self, sess: _Session) -> bool:
+        """Main-loop idle callback: disconnect and recycle a session detached mid-recording (one-shot)."""
+        if sess in self._retired:  # not already torn down by cleanup()
+            self._retired.remove(sess)
+            self._destroy_session(sess)
+        return False
+
+    @staticmethod
+    def _on_manual_done_c(info_p, user_data_p) -> None:
+        """Manual NvDsSR callback (best-effort), shared by all sources."""
+        who = "?"
+        if user_data_p:
+            uctx = ctypes.cast(user_data_p, ctypes.POINTER(SRUserContext)).contents
+            who = (
+                f"{uctx.source.decode('utf-8', 'replace')} (session {uctx.sessionid}, "
+                f"label {uctx.name.decode('utf-8', 'replace')})"
+            )
         try:
-            info = pyds.NvDsSRRecordingInfo.cast(info_p)
-            try:
-                dirp = pyds.get_string(info.dirpath)
-                filep = pyds.get_string(info.filename)
-            except Exception:
-                dirp = b"?"
-                filep = b"?"
-            print(f"[SR DONE MANUAL] file={filep} dir={dirp}")
-        except Exception as e:
-            print("[SR DONE MANUAL] error:", e)
+            info = _NvDsSRRecordingInfo_cast(info_p)
+            dirp = _pyds_get_string(info.dirpath)
+            filep = _pyds_get_string(info.filename)
+        except (AttributeError, TypeError):
+            dirp = filep = "?"
+        _log.info("[SR DONE MANUAL] %s file=%s dir=%s", who, filep, dirp)